@@ -1,4 +1,3 @@
-import random
 import torch
 
 import modules_general
@@ -27,12 +26,83 @@ def bce_tofloat_loss(pred, target, *args, **kwargs):
 	return torch.nn.functional.binary_cross_entropy_with_logits(pred, target.float(), *args, **kwargs)
 
 
-def balance_classes(subset: torch.utils.data.Subset, balance_factor: float):
+class ScaleImages(torch.nn.Module):
+	'''
+	Scale uint8 images to floats between 0 and 1, other images are passed through
+	'''
+	def forward(self, images: torch.Tensor) -> torch.Tensor:
+		if images.dtype == torch.uint8:
+			return images.float() / 255
+		return images
+
+
+class PreloadedDataset(torch.utils.data.TensorDataset):
+	def __init__(self, images: torch.Tensor, targets: torch.Tensor, classes: list):
+		super().__init__(images, targets)
+
+		self.targets = targets
+		self.classes = classes
+
+
+class LabelingSubset(torch.utils.data.Subset):
+	'''
+	Subset stored as a boolean membership mask over the dataset, indices are derived lazily in sorted order
+	'''
+	def __init__(self, dataset: torch.utils.data.Dataset, indices: list):
+		self.mask = torch.zeros(len(dataset), dtype=torch.bool)
+		super().__init__(dataset, indices)
+
+	def __len__(self) -> int:
+		return int(self.mask.sum())
+
+	@property
+	def indices(self) -> list:
+		if self._indices is None:
+			self._indices = self.mask.nonzero().squeeze(1).tolist()
+		return self._indices
+
+	@indices.setter
+	def indices(self, indices: list):
+		self.mask.zero_()
+		self.add_indices(indices)
+
+	def add_indices(self, indices: list):
+		self.mask[torch.as_tensor(indices, dtype=torch.long)] = True
+		self._indices = None
+
+	def remove_indices(self, indices: list):
+		self.mask[torch.as_tensor(indices, dtype=torch.long)] = False
+		self._indices = None
+
+
+class SubsetSampler(torch.utils.data.Sampler):
+	'''
+	Sample the current indices of a subset, so a dataloader over the full dataset follows labeling
+	'''
+	def __init__(self, subset: torch.utils.data.Subset, shuffle: bool = False):
+		self.subset = subset
+		self.shuffle = shuffle
+
+	def __iter__(self):
+		indices = list(self.subset.indices)
+		if self.shuffle:
+			return (indices[i] for i in torch.randperm(len(indices)).tolist())
+		return iter(indices)
+
+	def __len__(self) -> int:
+		return len(self.subset)
+
+
+def preload_mnist(data) -> PreloadedDataset:
+	'''
+	Convert a torchvision MNIST dataset to in-memory uint8 image and target tensors
+	'''
+	return PreloadedDataset(data.data.unsqueeze(1), data.targets.clone(), data.classes)
+
+
+def balance_classes(subset: LabelingSubset, balance_factor: float, dataset_class_indices: list):
 	# Divide all indices into classes
-	class_indices = [
-		[index for index in subset.indices if subset.dataset.targets[index] == c]
-		for c, _ in enumerate(subset.dataset.classes)
-	]
+	class_indices = [indices[subset.mask[indices]] for indices in dataset_class_indices]
 
 	# Generate class balance list
 	head = len(class_indices) // 2
@@ -41,11 +111,11 @@ def balance_classes(subset: torch.utils.data.Subset, balance_factor: float):
 
 	# Blance class_indices by the class balance weights
 	ref = min(len(indices) / balance[c] for c, indices in enumerate(class_indices))
-	balanced_indices = [random.sample(indices, int(ref * balance[c]))
-        for c, indices in enumerate(class_indices)
-    ]
+	balanced_indices = [indices[torch.randperm(len(indices))[:int(ref * balance[c])]]
+		for c, indices in enumerate(class_indices)
+	]
 
-	subset.indices = sum(balanced_indices, [])
+	subset.indices = torch.cat(balanced_indices).tolist()
 
 
 def get_modules(args):
@@ -146,11 +146,6 @@ def parse_arguments(*args, **kwargs):
 	return parser.parse_args(*args, **kwargs)
 
 
-def reset_weights(layer):
-	if hasattr(layer, 'reset_parameters'):
-		layer.reset_parameters()
-
-
 def main():
 	try:
 		args = parse_arguments()
@@ -172,12 +167,14 @@ def main():
 			auto_select_gpus=use_gpu,
 			deterministic=(args.seed is not None),
 			log_every_n_steps=10,
+			num_sanity_val_steps=0,
 			min_epochs=args.min_epochs,
 			max_epochs=-1,
 			logger=logger,
 			callbacks=[early_stopping_callback]
 		)
 		model, datamodule = data_utils.get_modules(args)
+		initial_state = {key: value.detach().clone() for key, value in model.state_dict().items()}
 
 		trainer.validate(model, datamodule)
 		if trainer.interrupted:
@@ -186,14 +183,17 @@ def main():
 		if trainer.interrupted:
 			raise KeyboardInterrupt
 
+		early_stopping_state = early_stopping_callback.state_dict()
 		auc_logs = collections.Counter()
 		for step in range(args.labeling_steps):
-			model.apply(reset_weights)
+			model.load_state_dict(initial_state)
 			ial_logs = dict()
 
 			trainer.fit(model, datamodule)
 			if trainer.interrupted:
 				raise KeyboardInterrupt
+			# The model summary does not change between steps, skip its example forward pass after the first
+			model.example_input_array = None
 			ial_logs.update({label.replace("running/", "final/"): value for label, value in trainer.logged_metrics.items()})
 
 			trainer.test(model, datamodule)
@@ -204,7 +204,7 @@ def main():
 			logger.log_metrics(ial_logs)
 			auc_logs += ial_logs
 
-			early_stopping_callback.best_score = torch.tensor(float('inf'))
+			early_stopping_callback.load_state_dict(early_stopping_state)
 
 			if step < args.labeling_steps - 1:
 				datamodule.label_data(model)
@@ -1,4 +1,5 @@
 import random
+import itertools
 import numpy
 import tqdm
 import torch
@@ -15,12 +16,18 @@ class IALDataModule(pl.LightningDataModule):
 
 		self.save_hyperparameters()
 		self.transform = torchvision.transforms.ToTensor()
+		self.pin_memory = torch.cuda.is_available()
 
 		self.data_train = None
 		self.data_val = None
 		self.data_test = None
 		self.data_unlabeled = None
 
+		self.targets = None
+		self.class_indices = None
+
+		self.loader_unlabeled = None
+
 		self.setup_fit_done = False
 		self.setup_test_done = False
 
@@ -31,18 +38,32 @@ class IALDataModule(pl.LightningDataModule):
 
 			data_full = self.get_data_train()
 
+			# Targets never change, so the indices of each class are computed only once
+			self.targets = torch.as_tensor(data_full.targets)
+			self.class_indices = [(self.targets == c).nonzero().squeeze(1) for c, _ in enumerate(data_full.classes)]
+
 			# Split dataset in unlabeled and validation sets randomly
 			size_train = round(len(data_full) * self.hparams.train_split)
 			size_val = len(data_full) - size_train
-			self.data_unlabeled, self.data_val = torch.utils.data.random_split(
+			data_unlabeled, self.data_val = torch.utils.data.random_split(
 				data_full,
 				[size_train, size_val]
 			)
-			self.data_train = torch.utils.data.Subset(data_full, [])
+			self.data_unlabeled = data_utils.LabelingSubset(data_full, data_unlabeled.indices)
+			self.data_train = data_utils.LabelingSubset(data_full, [])
 
-			data_utils.balance_classes(self.data_unlabeled, self.hparams.class_balance)
+			data_utils.balance_classes(self.data_unlabeled, self.hparams.class_balance, self.class_indices)
 			self.label_static_distribution(self.hparams.initial_labels)
 
+			# Acquisition bypasses the trainer, so this loader and its workers can be kept between steps
+			self.loader_unlabeled = torch.utils.data.DataLoader(
+				data_full,
+				batch_size=self.hparams.eval_batch_size,
+				sampler=data_utils.SubsetSampler(self.data_unlabeled),
+				num_workers=self.hparams.dataloader_workers,
+				persistent_workers=self.hparams.dataloader_workers > 0
+			)
+
 		if stage in ["test", None] and not self.setup_test_done:
 			self.setup_test_done = True
 
@@ -51,24 +72,30 @@ class IALDataModule(pl.LightningDataModule):
 
 	def train_dataloader(self):
 		return torch.utils.data.DataLoader(
-			self.data_train,
+			self.data_train.dataset,
 			batch_size=self.hparams.train_batch_size,
-			shuffle=True,
-			num_workers=self.hparams.dataloader_workers
+			sampler=data_utils.SubsetSampler(self.data_train, shuffle=True),
+			num_workers=self.hparams.dataloader_workers,
+			pin_memory=self.pin_memory,
+			persistent_workers=self.hparams.dataloader_workers > 0
 		)
 
 	def val_dataloader(self):
 		return torch.utils.data.DataLoader(
-			self.data_val,
+			self.data_val.dataset,
 			batch_size=self.hparams.eval_batch_size,
-			num_workers=self.hparams.dataloader_workers
+			sampler=data_utils.SubsetSampler(self.data_val),
+			num_workers=self.hparams.dataloader_workers,
+			pin_memory=self.pin_memory,
+			persistent_workers=self.hparams.dataloader_workers > 0
 		)
 
 	def test_dataloader(self):
 		return torch.utils.data.DataLoader(
 			self.data_test,
 			batch_size=self.hparams.eval_batch_size,
-			num_workers=self.hparams.dataloader_workers
+			num_workers=self.hparams.dataloader_workers,
+			pin_memory=self.pin_memory
 		)
 
 	def predict_dataloader(self):
@@ -80,59 +107,60 @@ class IALDataModule(pl.LightningDataModule):
 
 	def labeled_dataloader(self):
 		return torch.utils.data.DataLoader(
-			self.data_train,
+			self.data_train.dataset,
 			batch_size=self.hparams.eval_batch_size,
+			sampler=data_utils.SubsetSampler(self.data_train),
 			num_workers=self.hparams.dataloader_workers
 		)
 
 	def labeled_dataloader_single(self):
 		return torch.utils.data.DataLoader(
-			self.data_train,
+			self.data_train.dataset,
 			batch_size=1,
-			shuffle=True,
+			sampler=data_utils.SubsetSampler(self.data_train, shuffle=True),
 			num_workers=self.hparams.dataloader_workers
 		)
 
 	def unlabeled_dataloader(self):
-		return torch.utils.data.DataLoader(
-			self.data_unlabeled,
-			batch_size=self.hparams.eval_batch_size,
-			num_workers=self.hparams.dataloader_workers
-		)
+		return self.loader_unlabeled
 
 	def unlabeled_dataloader_single(self):
 		return torch.utils.data.DataLoader(
-			self.data_unlabeled,
+			self.data_unlabeled.dataset,
 			batch_size=1,
+			sampler=data_utils.SubsetSampler(self.data_unlabeled),
 			num_workers=self.hparams.dataloader_workers
 		)
 
 
 	@property
 	def class_balance(self):
-		return torch.tensor([len([index
-				for index in self.data_train.indices
-				if self.data_train.dataset.targets[index] == c
-			]) for c, _ in enumerate(self.data_train.dataset.classes)
-		])
+		return torch.bincount(self.targets[self.data_train.mask], minlength=len(self.class_indices))
 
 
 	def label_indices(self, indices: list):
-		self.data_train.indices = sorted(list(set(self.data_train.indices + indices)))
-		self.data_unlabeled.indices = sorted(list(set([index
-			for index in self.data_unlabeled.indices
-			if index not in indices
-		])))
+		self.data_train.add_indices(indices)
+		self.data_unlabeled.remove_indices(indices)
+
+	def label_top(self, scores: torch.Tensor, amount: int):
+		'''
+		Label the unlabeled images with the highest scores
+		'''
+		_, top_indices = scores.topk(amount)
+		unlabeled_indices = self.data_unlabeled.mask.nonzero().squeeze(1).to(top_indices.device)
+		self.label_indices(unlabeled_indices.index_select(0, top_indices).tolist())
+
+
+	def unlabeled_class_indices(self, class_num: int) -> list:
+		indices = self.class_indices[class_num]
+		return indices[self.data_unlabeled.mask[indices]].tolist()
 
 
 	def label_each_class(self, amount: int = 1):
-		self.label_indices(sum([
-			random.sample([index
-				for index in self.data_unlabeled.indices
-				if self.data_unlabeled.dataset.targets[index] == class_num
-			], amount)
-			for class_num, _ in enumerate(self.data_unlabeled.dataset.classes)
-		], []))
+		self.label_indices(list(itertools.chain.from_iterable([
+			random.sample(self.unlabeled_class_indices(class_num), amount)
+			for class_num, _ in enumerate(self.class_indices)
+		])))
 
 
 	def label_static_distribution(self, amount: int):
@@ -141,10 +169,8 @@ class IALDataModule(pl.LightningDataModule):
 		'''
 		unlabeled_data_count = len(self.data_unlabeled)
 		unlabeled_class_indices = [
-			[index
-				for index in self.data_unlabeled.indices
-				if self.data_unlabeled.dataset.targets[index] == class_num
-			] for class_num, _ in enumerate(self.data_unlabeled.dataset.classes)
+			self.unlabeled_class_indices(class_num)
+			for class_num, _ in enumerate(self.class_indices)
 		]
 
 		# Label amount of images from each class relative to its size (rounded down)
@@ -155,13 +181,10 @@ class IALDataModule(pl.LightningDataModule):
 			labels_remaining -= class_labeling_count
 
 		# Choose random classes to label the remaining images
-		self.label_indices(sum([
-			random.sample([index
-				for index in self.data_unlabeled.indices
-				if self.data_unlabeled.dataset.targets[index] == class_num
-			], 1)
-			for class_num in random.sample(range(len(self.data_unlabeled.dataset.classes)), labels_remaining)
-		], []))
+		self.label_indices(list(itertools.chain.from_iterable([
+			random.sample(self.unlabeled_class_indices(class_num), 1)
+			for class_num in random.sample(range(len(self.class_indices)), labels_remaining)
+		])))
 
 
 	def label_randomly(self, amount: int, model: pl.LightningModule = None):
@@ -171,40 +194,40 @@ class IALDataModule(pl.LightningDataModule):
 
 	def label_uncertain(self, amount: int, model: pl.LightningModule, uncertainty_method: str):
 		if uncertainty_method == 'entropy':
-			def uncertainty_method_fn(preds):
-				return -(preds*preds.log()).sum(1).nan_to_num(0)
+			def uncertainty_method_fn(log_preds):
+				return -(log_preds.exp()*log_preds).sum(1)
 
 		elif uncertainty_method == 'margin':
-			def uncertainty_method_fn(preds):
-				return 1 - preds.topk(2, dim=1)[0].diff(dim=1).abs().squeeze(1)
+			def uncertainty_method_fn(log_preds):
+				return 1 - log_preds.topk(2, dim=1)[0].exp().diff(dim=1).abs().squeeze(1)
 
 		elif uncertainty_method == 'least-confident':
-			def uncertainty_method_fn(preds):
-				return 1 - preds.max(1)[0]
+			def uncertainty_method_fn(log_preds):
+				return 1 - log_preds.max(1)[0].exp()
 
 		else:
 			raise ValueError(f"{uncertainty_method} is no valid uncertainty method")
 
 		uncertainty_list = []
-		with torch.no_grad():
+		with torch.inference_mode():
 			for batch in tqdm.tqdm(self.unlabeled_dataloader(), desc='Labeling'):
 				images, _ = batch
 				output, _ = model(images)
 
 				try:
 					# Multiclass, softmax
-					preds = torch.nn.functional.softmax(output, 1)
+					log_preds = torch.nn.functional.log_softmax(output, 1)
 				except IndexError:
 					# Binary, sigmoid
-					preds_binary = torch.sigmoid(output)
-					preds = torch.stack([preds_binary, 1 - preds_binary], 1)
+					log_preds = torch.stack([
+						torch.nn.functional.logsigmoid(output),
+						torch.nn.functional.logsigmoid(-output)
+					], 1)
 
-				uncertainty_list.append(uncertainty_method_fn(preds))
+				uncertainty_list.append(uncertainty_method_fn(log_preds))
 
 			uncertainty = torch.cat(uncertainty_list)
-			_, top_indices = uncertainty.topk(amount)
-			chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-			self.label_indices(chosen_indices)
+			self.label_top(uncertainty, amount)
 
 	def label_entropy(self, amount: int, model: pl.LightningModule):
 		self.label_uncertain(amount, model, 'entropy')
@@ -286,13 +309,16 @@ class IALDataModule(pl.LightningDataModule):
 
 					try:
 						# Multiclass, softmax
-						preds = torch.nn.functional.softmax(output, 1)
+						log_preds = torch.nn.functional.log_softmax(output, 1)
 					except IndexError:
 						# Binary, sigmoid
-						preds_binary = torch.sigmoid(output)
-						preds = torch.stack([preds_binary, 1 - preds_binary], 1)
+						log_preds = torch.stack([
+							torch.nn.functional.logsigmoid(output),
+							torch.nn.functional.logsigmoid(-output)
+						], 1)
 
-					uncertainty_score = -(preds*preds.log()).sum(1).nan_to_num(0)
+					preds = log_preds.exp()
+					uncertainty_score = -(preds*log_preds).sum(1)
 					balance_omega = torch.clamp(len(self.data_train) / len(self.data_train.dataset.classes) - self.class_balance, min=0)
 					balance_penalty = self.hparams.class_balancing_factor * torch.norm(balance_omega.unsqueeze(0) - preds, p=1, dim=1)
 
@@ -316,9 +342,7 @@ class IALDataModule(pl.LightningDataModule):
 				uncertainty_list.append(losses_hat)
 
 			uncertainty = torch.cat(uncertainty_list)
-			_, top_indices = uncertainty.topk(amount)
-			chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-			self.label_indices(chosen_indices)
+			self.label_top(uncertainty, amount)
 
 
 	# Active Learning for Convolutional Neural Networks: A Core-Set Approach
@@ -457,45 +481,27 @@ class IALDataModule(pl.LightningDataModule):
 
 	def label_influence(self, amount: int, model: pl.LightningModule):
 		influences = self.rank_influence(model)
-
-		_, top_indices = influences.topk(amount)
-		chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-		self.label_indices(chosen_indices)
+		self.label_top(influences, amount)
 
 	def label_influence_abs(self, amount: int, model: pl.LightningModule):
 		influences = self.rank_influence(model).abs()
-
-		_, top_indices = influences.topk(amount)
-		chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-		self.label_indices(chosen_indices)
+		self.label_top(influences, amount)
 
 	def label_influence_neg(self, amount: int, model: pl.LightningModule):
 		influences = -self.rank_influence(model)
-
-		_, top_indices = influences.topk(amount)
-		chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-		self.label_indices(chosen_indices)
+		self.label_top(influences, amount)
 
 	def label_influence_real(self, amount: int, model: pl.LightningModule):
 		influences = self.rank_influence(model, real=True)
-
-		_, top_indices = influences.topk(amount)
-		chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-		self.label_indices(chosen_indices)
+		self.label_top(influences, amount)
 
 	def label_influence_abs_real(self, amount: int, model: pl.LightningModule):
 		influences = self.rank_influence(model, real=True).abs()
-
-		_, top_indices = influences.topk(amount)
-		chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-		self.label_indices(chosen_indices)
+		self.label_top(influences, amount)
 
 	def label_influence_neg_real(self, amount: int, model: pl.LightningModule):
 		influences = -self.rank_influence(model, real=True)
-
-		_, top_indices = influences.topk(amount)
-		chosen_indices = [self.data_unlabeled.indices[i] for i in top_indices]
-		self.label_indices(chosen_indices)
+		self.label_top(influences, amount)
 
 
 	def label_data(self, model):
@@ -546,7 +552,7 @@ class IALModel(pl.LightningModule):
 
 		self.example_input_array = torch.zeros([self.hparams.train_batch_size, image_depth, image_size, image_size])
 
-		convolutional = []
+		convolutional = [data_utils.ScaleImages()]
 		size_prev = image_depth
 		final_size = image_size
 		for size in layers_conv:
@@ -1,5 +1,6 @@
 import torchvision
 
+import data_utils
 import modules_general
 
 
@@ -14,16 +15,18 @@ class MNISTDataModule(modules_general.IALDataModule):
 
 
 	def get_data_train(self):
-		return torchvision.datasets.MNIST(
+		data = torchvision.datasets.MNIST(
 			self.hparams.data_dir,
-			train=True,
-			transform=self.transform
+			train=True
 		)
 
+		return data_utils.preload_mnist(data)
+
 
 	def get_data_test(self):
-		return torchvision.datasets.MNIST(
+		data = torchvision.datasets.MNIST(
 			self.hparams.data_dir,
-			train=False,
-			transform=self.transform
+			train=False
 		)
+
+		return data_utils.preload_mnist(data)
@@ -1,5 +1,6 @@
 import torchvision
 
+import data_utils
 import modules_general
 
 
@@ -16,26 +17,24 @@ class MNISTBinaryDataModule(modules_general.IALDataModule):
 	def get_data_train(self):
 		data = torchvision.datasets.MNIST(
 			self.hparams.data_dir,
-			train=True,
-			transform=self.transform
+			train=True
 		)
 
 		# Change labels to even (0) or odd (1) numbers
 		data.targets %= 2
 		data.classes = ['even', 'odd']
 
-		return data
+		return data_utils.preload_mnist(data)
 
 
 	def get_data_test(self):
 		data = torchvision.datasets.MNIST(
 			self.hparams.data_dir,
-			train=False,
-			transform=self.transform
+			train=False
 		)
 
 		# Change labels to even (0) or odd (1) numbers
 		data.targets %= 2
 		data.classes = ['even', 'odd']
 
-		return data
+		return data_utils.preload_mnist(data)
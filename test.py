@@ -25,9 +25,11 @@ def main():
 
 def check_labeled_data(datamodule: pl.LightningDataModule, labeled_count: int):
 	assert len(datamodule.data_train) == labeled_count
-	assert len(datamodule.data_train) - len(set(datamodule.data_train)) == 0
-	assert len(datamodule.data_unlabeled) - len(set(datamodule.data_unlabeled)) == 0
-	assert len(set(datamodule.data_train).intersection(set(datamodule.data_unlabeled))) == 0
+	assert int(datamodule.data_train.mask.sum()) == labeled_count
+	assert not (datamodule.data_train.mask & datamodule.data_unlabeled.mask).any()
+
+	# Aquisition methods map dataloader positions back through the subset indices
+	assert list(data_utils.SubsetSampler(datamodule.data_unlabeled)) == datamodule.data_unlabeled.indices
 
 
 def test_datasets():